@@ -1,22 +1,80 @@
-from io import BytesIO
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from datetime import datetime
 import os
-import shutil
-from typing import Type, Union
+import re
+import threading
+from typing import NamedTuple, Type, Union
+from urllib.parse import urlparse
+from uuid import uuid4
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
 
 import httpx
 import validators
-from PIL import Image
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import Browser, sync_playwright
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from selectolax.parser import HTMLParser
 
 # Custom type hint
 ParsedHTML = Type[HTMLParser]
 
+
+class DownloadedImage(NamedTuple):
+    filename: str
+    content: bytes
+
+
 # Global variables
 MIN_LINKS = 5
 TEMP_DL_FOLDER = "imghunt/temp_dl"
+TEMP_DL_PATH = Path.cwd() / TEMP_DL_FOLDER
+MONTHS = (
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+)
 TAGS = ["src", "srcset", "data-src", "data-srcset", "data-fallback-src"]
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36"  # noqa
+}
+MAX_CONNECTIONS = 20
+IMG_WAIT_MS = 3000
+CONTENT_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "image/svg+xml": "svg",
+    "image/avif": "avif",
+    "image/bmp": "bmp",
+    "image/tiff": "tiff",
+    "image/x-icon": "ico",
+    "image/vnd.microsoft.icon": "ico",
+}
+GENERIC_CONTENT_TYPES = {"", "application/octet-stream", "binary/octet-stream"}
+IMAGE_EXTENSIONS = {*CONTENT_TYPES.values(), "jpeg", "tif"}
+# Used when an image's exact format can't be told from a trusted source
+FALLBACK_EXTENSION = "img"
+# Text-based formats still shrink under deflate; raster formats do not
+COMPRESSIBLE_EXTENSIONS = {"svg", "bmp", "tif", "tiff", "ico"}
+URL_PATTERN = re.compile(r"https?://[^\s<>\"'`]+", re.IGNORECASE)
+
+# Playwright's sync API is bound to the thread that started it, so renders
+# run on long-lived worker threads that each keep their own browser alive
+# between scrapes. The Playwright driver process closes them when the
+# interpreter exits.
+PLAYWRIGHT_POOL = ThreadPoolExecutor(max_workers=2)
+BROWSERS = threading.local()
 
 
 def check_url(query: str) -> Union[list[str], str]:
@@ -24,12 +82,11 @@ def check_url(query: str) -> Union[list[str], str]:
         return ["Invalid URL. Try again!"]
 
 
-def get_request(query: str) -> Union[httpx.Response, list[str]]:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36"  # noqa
-    }
+async def get_request(
+    client: httpx.AsyncClient, query: str
+) -> Union[httpx.Response, list[str]]:
     try:
-        response = httpx.get(query, headers=headers, follow_redirects=True)
+        response = await client.get(query)
         response.raise_for_status()
         return response
     except (httpx.HTTPError, httpx.RequestError) as error:
@@ -66,10 +123,13 @@ def get_raw_image_links(tree: ParsedHTML, attributes: list[str]) -> list[str]:
 
 # ! Inside 'get_raw_image_links'
 def image_nodes(tree: ParsedHTML, attributes: list[str]) -> list[str]:
-    """Fetches all <img> nodes from DOM then extracts link(s) inside each node."""
+    """
+    Fetches the <img> nodes carrying each attribute from DOM then extracts
+    link(s) inside each node. Filtering happens in selectolax's CSS engine.
+    """
     result = []
-    for node in tree.css("img"):
-        for i in attributes:
+    for i in attributes:
+        for node in tree.css(f"img[{i}]"):
             if src := node.attributes.get(i):
                 result.append(src)
     return result
@@ -89,20 +149,44 @@ def check_nested_links(links: list[str]) -> list[str]:
     Returns:
         list[str]: Combined list of URLs if any found.
     """
-    url_filter = []
-    if any(" " in link for link in links):
-        for idx, link in enumerate(links):
-            if " " in link:
-                link = links.pop(idx)
-                items = link.replace(",", "").split(" ")
-                url_filter.extend(item for item in items if valid_url(item))
-        return links + url_filter
-    return links
+    simple_links = []
+    nested_links = []
+    for link in links:
+        (nested_links if " " in link else simple_links).append(link)
+
+    url_filter = [
+        item
+        for link in nested_links
+        for item in link.replace(",", "").split()
+        if valid_url(item)
+    ]
+    return list(dict.fromkeys(simple_links + url_filter))
 
 
 # ! Inside 'check_nested_links'
-def valid_url(url: str):
-    return bool(validators.url(url))
+def valid_url(url: str) -> bool:
+    """
+    Cheap check for scraped image links: a precompiled regex prefilter followed
+    by a structural parse. User input still goes through 'validators' in
+    'check_url'.
+    """
+    if not URL_PATTERN.fullmatch(url):
+        return False
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        # e.g. unbalanced '[' or ']' in the host ("Invalid IPv6 URL")
+        return False
+    return bool(parsed.scheme and parsed.netloc)
+
+
+def looks_js_heavy(tree: ParsedHTML) -> bool:
+    """
+    Flags pages that render their content client-side: an app mount point or
+    <noscript> fallback with almost no <img> nodes in the served HTML.
+    """
+    has_js_markers = tree.css_first("div#root, div#app, noscript") is not None
+    return has_js_markers and len(tree.css("img")) < 3
 
 
 def run_playwright(url: str, attributes: list[str]) -> list[str]:
@@ -110,45 +194,66 @@ def run_playwright(url: str, attributes: list[str]) -> list[str]:
     Alternate HTML extraction method. Uses Playwright to open a headless browser
     which allows for Javascript-heavy pages to load first before scraping.
     """
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
+    context = get_browser().new_context()
+    try:
+        page = context.new_page()
         page.goto(url)
+        try:
+            # Client-rendered pages may only add <img> nodes after 'load'
+            page.wait_for_selector("img", timeout=IMG_WAIT_MS)
+        except PlaywrightTimeoutError:
+            pass
         response = page.content()
-        tree = HTMLParser(response)
+    finally:
+        context.close()
+    tree = HTMLParser(response)
     return get_raw_image_links(tree, attributes)
 
 
+# ! Inside 'run_playwright'
+def get_browser() -> Browser:
+    """
+    Launches Chromium on first use in the current thread, then reuses it.
+    Relaunches if the cached browser has crashed or disconnected.
+    """
+    browser = getattr(BROWSERS, "browser", None)
+    if browser is not None and browser.is_connected():
+        return browser
+
+    if (playwright := getattr(BROWSERS, "playwright", None)) is not None:
+        try:
+            playwright.stop()
+        except Exception:
+            # The driver may already be gone along with the browser
+            pass
+    BROWSERS.playwright = sync_playwright().start()
+    BROWSERS.browser = BROWSERS.playwright.chromium.launch()
+    return BROWSERS.browser
+
+
 def check_link_validity(
     raw_links: list[str], query: str, canonical_url: str
 ) -> tuple[list, list]:
+    base_url = canonical_url or query
     valid_links = []
     error_links = []
-    max_checks = 3
 
     for link in raw_links:
-        for i in range(max_checks):
-            # Check for multiple '//'
+        # Check for multiple '//'
+        link = check_slashes(link)
+
+        # Apply correction to URL where it isn't valid as-is
+        if not valid_url(link):
+            if link.startswith("//"):
+                # Add https: if missing
+                link = f"https:{link}"
+            elif link.startswith("/"):
+                # Add base or canonical URL if only starting with '/'
+                link = f"{base_url}{link}"
             link = check_slashes(link)
 
-            # Check for valid URL
-            if valid_url(link):
-                valid_links.append(link)
-                break
-
-            # Apply correction to URL. Proceed to go through each check layer.
-            if i == 0:
-                # Check No. 1: add https: if missing
-                if link.startswith("//"):
-                    link = f"https:{link}"
-            elif i == 1:
-                # Check No. 2: add base or canonical URL if only starting with '/'.
-                if link[0] == "/" and link[1] != "/":
-                    link = (
-                        f"{query}{link}"
-                        if canonical_url is None
-                        else f"{canonical_url}{link}"
-                    )
+        if valid_url(link):
+            valid_links.append(link)
         else:
             error = ["First Pass - Invalid Link", link]
             error_links.append(error)
@@ -157,78 +262,165 @@ def check_link_validity(
 
 # ! Inside 'check_link_validity'
 def check_slashes(link: str) -> str:
-    if link.count("//") > 1:
-        link = link.replace("://", "::").replace("//", "/").replace("::", "://")
-    return link
+    # Most links hold at most one '//', so bail out before any replacing.
+    first = link.find("//")
+    if first < 0 or link.find("//", first + 2) < 0:
+        return link
+    # NUL can't appear in a URL, unlike '::' in IPv6 literals.
+    return link.replace("://", "\x00").replace("//", "/").replace("\x00", "://")
+
+
+async def remove_dead_links(
+    client: httpx.AsyncClient, valid_links: list[str]
+) -> tuple[list, list]:
+    """
+    Sends a HEAD request to every link concurrently and drops the ones that
+    no longer resolve before they are downloaded. Errors saved to separate list.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONNECTIONS)
+    tasks = [probe_link(semaphore, client, link) for link in valid_links]
+    live_mask = await asyncio.gather(*tasks)
+
+    live_links = []
+    error_links = []
+    for link, is_live in zip(valid_links, live_mask):
+        if is_live:
+            live_links.append(link)
+        else:
+            error_links.append(["First Pass - Dead Link", link])
+    return (live_links, error_links)
 
 
-def download_images(valid_links: list[str]) -> tuple[dict[str, list], list]:
+# ! Inside 'remove_dead_links'
+async def probe_link(
+    semaphore: asyncio.Semaphore, client: httpx.AsyncClient, link: str
+) -> bool:
+    async with semaphore:
+        try:
+            response = await client.head(link, timeout=5)
+        except Exception:
+            # Any failure (incl. httpx.InvalidURL, which isn't an HTTPError)
+            # marks the link as dead rather than aborting the scrape
+            return False
+    # Some servers refuse HEAD outright. Leave those for the GET to decide.
+    return response.status_code < 400 or response.status_code in (405, 501)
+
+
+async def download_images(
+    client: httpx.AsyncClient, valid_links: list[str], zip_file: ZipFile
+) -> tuple[int, list[list[str]]]:
     """
     Attempts to extract images from validated URLs. Errors saved to separate list.
+    All image URLs are fetched concurrently and each image is written to the
+    zip archive as soon as its own fetch completes, so bodies don't pile up in
+    memory.
 
     Args:
+        client (httpx.AsyncClient): Shared client for the scrape.
         valid_links (list[str]): Image URLs
+        zip_file (ZipFile): Open zip archive inside temp download folder.
 
     Returns:
-        tuple[dict[str, list], list]:
-        Dict contains: {IMG name: [PIL object, URL],
-        Error List contains: [error msg, URL]
+        tuple[int, list[list[str]]]: Successful downloads and errors when downloading.
     """
-    results = {}
     errors = []
-    for idx, link in enumerate(valid_links, start=1):
-        try:
-            # Fetch Image & add to dict
-            r = get_request(link)
-            img_object = Image.open(BytesIO(r.content))
-            filename = f"IMG_{idx}.{img_object.format}"
-            results[filename] = [img_object, link]
-        except Exception as exc:
-            invalid_image = [str(exc), link]
+    success_count = 0
+    # Only as many requests in flight as the pool has connections, so queued
+    # fetches don't hit the pool timeout
+    semaphore = asyncio.Semaphore(MAX_CONNECTIONS)
+    tasks = [
+        download_image(semaphore, client, zip_file, idx, link)
+        for idx, link in enumerate(valid_links, start=1)
+    ]
+    downloads = await asyncio.gather(*tasks, return_exceptions=True)
+    for link, download in zip(valid_links, downloads):
+        if isinstance(download, Exception):
+            invalid_image = [str(download), link]
             errors.append(invalid_image)
-    return (results, errors)
+        else:
+            success_count += 1
+    return (success_count, errors)
+
+
+# ! Inside 'download_images'
+async def download_image(
+    semaphore: asyncio.Semaphore,
+    client: httpx.AsyncClient,
+    zip_file: ZipFile,
+    idx: int,
+    link: str,
+) -> None:
+    image = await fetch_image(semaphore, client, idx, link)
+    # No await between fetch and write, so tasks never interleave inside the
+    # zip file
+    save_image(zip_file, image)
+
+
+# ! Inside 'download_image'
+async def fetch_image(
+    semaphore: asyncio.Semaphore, client: httpx.AsyncClient, idx: int, link: str
+) -> DownloadedImage:
+    async with semaphore:
+        response = await client.get(link)
+    response.raise_for_status()
+    if (extension := file_extension(response, link)) is None:
+        raise ValueError("Response is not an image")
+    filename = f"IMG_{idx}.{extension}"
+    return DownloadedImage(filename, response.content)
+
+
+# ! Inside 'fetch_image'
+def file_extension(response: httpx.Response, link: str) -> Union[str, None]:
+    """
+    Derives the file extension from the Content-Type header. The URL path is
+    only consulted when the header is missing, generic or an unmapped image
+    type, so an HTML error page served from '.../photo.jpg' is still rejected.
+    Header text never ends up in the filename. Returns None if the response
+    isn't identified as an image.
+    """
+    content_type = response.headers.get("content-type", "").split(";")[0].strip()
+    content_type = content_type.lower()
+    if extension := CONTENT_TYPES.get(content_type):
+        return extension
+    is_image = content_type.startswith("image/")
+    if is_image or content_type in GENERIC_CONTENT_TYPES:
+        extension = os.path.splitext(urlparse(link).path)[1].lstrip(".").lower()
+        if extension in IMAGE_EXTENSIONS:
+            return extension
+    return FALLBACK_EXTENSION if is_image else None
 
 
 def create_folder() -> str:
-    dt_object = datetime.now().strftime("%d-%b-%y_%H-%M-%S")
-    return f"IMGHUNT_{dt_object}"
+    # Same format as strftime("%d-%b-%y_%H-%M-%S")
+    t = datetime.now()
+    dt_object = (
+        f"{t.day:02d}-{MONTHS[t.month - 1]}-{t.year % 100:02d}_"
+        f"{t.hour:02d}-{t.minute:02d}-{t.second:02d}"
+    )
+    # Suffix keeps scrapes started in the same second apart
+    return f"IMGHUNT_{dt_object}_{uuid4().hex[:8]}"
 
 
-def create_paths(temp_folder: str, imghunt_folder: str) -> tuple[str]:
+def create_paths(imghunt_folder: str) -> tuple[str]:
     # Path to 'temp_dl'
-    source_dir = os.path.join(os.getcwd(), temp_folder)
+    source_dir = TEMP_DL_PATH
 
     # Path to download folder (e.g. IMGHUNT...)
-    destination_dir = os.path.join(source_dir, imghunt_folder)
+    destination_dir = source_dir / imghunt_folder
 
-    return (source_dir, destination_dir)
+    return (str(source_dir), str(destination_dir))
 
 
-def save_images(directory_path: str, images: dict) -> tuple[int, list[list[str]]]:
+# ! Inside 'download_image'
+def save_image(zip_file: ZipFile, image: DownloadedImage) -> None:
     """
-    Save downloaded images to user-defined directory path. Tracks successful
-    downloads and pushes errors to separate list.
-
-    Args:
-        directory_path (str): Temp download folder.
-        images (dict): Contains PIL image object.
-
-    Returns:
-        tuple[int, list[list[str]]]: Successful downloads and errors when downloading.
+    Writes one downloaded image into the zip archive. Entries are stored
+    uncompressed unless the format is one deflate can still shrink (see
+    'COMPRESSIBLE_EXTENSIONS').
     """
-    errors = []
-    success_count = 0
-    for filename, value in images.items():
-        img_object = value[0]
-        url = value[1]
-        filepath = os.path.join(directory_path, filename)
-        try:
-            img_object.save(filepath)
-            success_count += 1
-        except Exception as exc:
-            invalid_image = [str(exc), url]
-            errors.append(invalid_image)
-    return (success_count, errors)
+    extension = image.filename.rpartition(".")[2]
+    compress_type = ZIP_DEFLATED if extension in COMPRESSIBLE_EXTENSIONS else ZIP_STORED
+    zip_file.writestr(image.filename, image.content, compress_type=compress_type)
 
 
 def scraper(query: str) -> dict:
@@ -237,51 +429,58 @@ def scraper(query: str) -> dict:
     if isinstance(initial_check, list):
         return initial_check
 
-    # Fetch response
-    response = get_request(query)
-    if isinstance(response, list):
-        return response
-
-    # Fetch HTML + canonical URL
-    tree = parse_html(response)
-    canonical_url = get_canonical_url(tree)
-
-    # Fetch raw image links
-    raw_links = get_raw_image_links(tree=tree, attributes=TAGS)
+    return asyncio.run(scrape(query))
 
-    # Use Playwright where minimal links found. Indicates JS-heavy website.
-    num_raw_links = len(raw_links)
-    if num_raw_links == 0:
-        return [f"Unable to access images at {query}"]
-    elif num_raw_links < MIN_LINKS:
-        raw_links = run_playwright(url=query, attributes=TAGS)
 
-    # Validate image URLs
-    valid_links, error_links = check_link_validity(raw_links, query, canonical_url)
-
-    # Fetch image URLs
-    extracted_images, dl_errors = download_images(valid_links)
-    error_links = error_links + dl_errors
-
-    # Create new local paths
-    temp_dir = create_folder()
-    source_dir, destination_dir = create_paths(
-        temp_folder=TEMP_DL_FOLDER, imghunt_folder=temp_dir
-    )
-    os.mkdir(destination_dir)
-
-    # Download images
-    success_count, final_errors = save_images(
-        directory_path=destination_dir, images=extracted_images
-    )
-    error_links = error_links + final_errors
-
-    # Create zip folder
-    shutil.make_archive(
-        base_name=os.path.join(source_dir, temp_dir),
-        format="zip",
-        root_dir=destination_dir
+# ! Inside 'scraper'
+async def scrape(query: str) -> dict:
+    """
+    Runs every network stage of a scrape on one event loop, sharing a single
+    connection pool between the page request, link probes and image downloads.
+    """
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS
     )
+    async with httpx.AsyncClient(
+        headers=HEADERS, limits=limits, timeout=15, follow_redirects=True
+    ) as client:
+        # Fetch response
+        response = await get_request(client, query)
+        if isinstance(response, list):
+            return response
+
+        # Fetch HTML + canonical URL
+        tree = parse_html(response)
+        canonical_url = get_canonical_url(tree)
+
+        # Fetch raw image links
+        raw_links = get_raw_image_links(tree=tree, attributes=TAGS)
+
+        # Use Playwright where minimal links found on a JS-heavy website.
+        num_raw_links = len(raw_links)
+        if num_raw_links == 0:
+            return [f"Unable to access images at {query}"]
+        elif num_raw_links < MIN_LINKS and looks_js_heavy(tree):
+            loop = asyncio.get_running_loop()
+            raw_links = await loop.run_in_executor(
+                PLAYWRIGHT_POOL, run_playwright, query, TAGS
+            )
+
+        # Validate image URLs
+        valid_links, error_links = check_link_validity(raw_links, query, canonical_url)
+        valid_links, dead_links = await remove_dead_links(client, valid_links)
+        error_links = error_links + dead_links
+
+        # Create new local paths
+        temp_dir = create_folder()
+        source_dir, destination_dir = create_paths(imghunt_folder=temp_dir)
+
+        # Download images straight into zip folder
+        with ZipFile(f"{destination_dir}.zip", "x", ZIP_STORED) as zip_file:
+            success_count, dl_errors = await download_images(
+                client, valid_links, zip_file
+            )
+        error_links = error_links + dl_errors
 
     return {
         "num_raw_links": num_raw_links,
@@ -1,3 +1,315 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+from concurrent.futures import Future
+from functools import partial
+from pathlib import Path
+from unittest import mock
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
 
-# Create your tests here.
+import httpx
+from django.http import FileResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from .scraper import (
+    check_link_validity,
+    check_nested_links,
+    check_slashes,
+    file_extension,
+    scraper,
+    valid_url,
+)
+from .views import download_zip, log_cleanup_error, remove_downloads
+
+
+class ValidUrlTests(SimpleTestCase):
+    def test_accepts_http_and_https_links(self):
+        self.assertTrue(valid_url("https://example.com/img.jpg"))
+        self.assertTrue(valid_url("http://example.com/a/b.png?w=200"))
+
+    def test_rejects_relative_and_malformed_links(self):
+        for link in ["/img.jpg", "//example.com/img.jpg", "https://", "img.jpg"]:
+            with self.subTest(link=link):
+                self.assertFalse(valid_url(link))
+
+    def test_rejects_links_with_whitespace(self):
+        self.assertFalse(valid_url("https://example.com/a.jpg 2x"))
+
+    def test_rejects_unbalanced_brackets_without_raising(self):
+        self.assertFalse(valid_url("https://[abc/img.jpg"))
+        self.assertFalse(valid_url("http://a]b/x.png"))
+
+
+class CheckNestedLinksTests(SimpleTestCase):
+    def test_splits_adjacent_nested_links(self):
+        links = [
+            "https://a.com/1.jpg 1x, https://a.com/2.jpg 2x",
+            "https://a.com/3.jpg 1x, https://a.com/4.jpg 2x",
+            "https://a.com/5.jpg",
+        ]
+        self.assertEqual(
+            check_nested_links(links),
+            [
+                "https://a.com/5.jpg",
+                "https://a.com/1.jpg",
+                "https://a.com/2.jpg",
+                "https://a.com/3.jpg",
+                "https://a.com/4.jpg",
+            ],
+        )
+
+    def test_drops_invalid_tokens_and_duplicates(self):
+        links = [
+            "https://a.com/1.jpg",
+            "https://a.com/1.jpg 480w, /relative.jpg 800w",
+            "https://a.com/1.jpg",
+        ]
+        self.assertEqual(check_nested_links(links), ["https://a.com/1.jpg"])
+
+
+class CheckSlashesTests(SimpleTestCase):
+    def test_leaves_single_scheme_links_untouched(self):
+        link = "https://a.com/img.jpg"
+        self.assertIs(check_slashes(link), link)
+
+    def test_collapses_repeated_slashes_after_scheme(self):
+        self.assertEqual(
+            check_slashes("https://a.com//b//c.png"), "https://a.com/b/c.png"
+        )
+
+    def test_keeps_ipv6_literals_intact(self):
+        self.assertEqual(
+            check_slashes("https://[::1]//img.png"), "https://[::1]/img.png"
+        )
+
+
+class CheckLinkValidityTests(SimpleTestCase):
+    def test_corrects_scheme_relative_and_root_relative_links(self):
+        valid, errors = check_link_validity(
+            ["//cdn.a.com/x.png", "/img/y.jpg", "https://a.com//z.gif"],
+            query="https://site.com",
+            canonical_url=None,
+        )
+        self.assertEqual(
+            valid,
+            [
+                "https://cdn.a.com/x.png",
+                "https://site.com/img/y.jpg",
+                "https://a.com/z.gif",
+            ],
+        )
+        self.assertEqual(errors, [])
+
+    def test_prefers_canonical_url(self):
+        valid, _ = check_link_validity(
+            ["/y.jpg"], query="https://site.com/page", canonical_url="https://site.com"
+        )
+        self.assertEqual(valid, ["https://site.com/y.jpg"])
+
+    def test_bare_slash_does_not_raise(self):
+        valid, errors = check_link_validity(["/"], "https://site.com", None)
+        self.assertEqual(valid, ["https://site.com/"])
+        self.assertEqual(errors, [])
+
+    def test_reports_uncorrectable_links(self):
+        valid, errors = check_link_validity(["img.jpg"], "https://site.com", None)
+        self.assertEqual(valid, [])
+        self.assertEqual(errors, [["First Pass - Invalid Link", "img.jpg"]])
+
+
+class FileExtensionTests(SimpleTestCase):
+    def extension(self, link, content_type=None):
+        headers = {"content-type": content_type} if content_type else {}
+        return file_extension(httpx.Response(200, headers=headers), link)
+
+    def test_uses_content_type(self):
+        self.assertEqual(self.extension("https://a.com/x", "image/jpeg"), "jpg")
+        self.assertEqual(
+            self.extension("https://a.com/x.png", "image/webp; q=1"), "webp"
+        )
+
+    def test_maps_icon_types(self):
+        self.assertEqual(self.extension("https://a.com/f", "image/x-icon"), "ico")
+        self.assertEqual(
+            self.extension("https://a.com/f", "image/vnd.microsoft.icon"), "ico"
+        )
+
+    def test_never_uses_header_text_for_unmapped_image_types(self):
+        for content_type in ["image/x/../../evil", "image/heic", "image/"]:
+            with self.subTest(content_type=content_type):
+                self.assertEqual(self.extension("https://a.com/f", content_type), "img")
+        self.assertEqual(
+            self.extension("https://a.com/f.JPEG", "image/x/../../evil"), "jpeg"
+        )
+
+    def test_falls_back_to_url_for_generic_content_types(self):
+        self.assertEqual(self.extension("https://a.com/x.PNG"), "png")
+        self.assertEqual(
+            self.extension("https://a.com/x.jpg", "application/octet-stream"), "jpg"
+        )
+        self.assertIsNone(
+            self.extension("https://a.com/x.php", "application/octet-stream")
+        )
+
+    def test_rejects_explicit_non_image_types(self):
+        self.assertIsNone(self.extension("https://a.com/photo.jpg", "text/html"))
+        self.assertIsNone(self.extension("https://a.com/photo.jpg", "application/json"))
+
+
+PAGE = """
+<html><body>
+<img src="https://cdn.test/a.jpg">
+<img src="https://cdn.test/b.svg">
+<img src="https://cdn.test/dead.png">
+<img src="https://cdn.test/page.jpg">
+<img src="https://cdn.test/no-head.png">
+<img src="https://cdn.test/no-head.gif">
+<img src="https://cdn.test:abc/bad-port.jpg">
+</body></html>
+"""
+
+
+def fake_site(request: httpx.Request) -> httpx.Response:
+    if request.url.host == "site.test":
+        return httpx.Response(200, headers={"content-type": "text/html"}, text=PAGE)
+
+    path = request.url.path
+    if path == "/dead.png":
+        return httpx.Response(404)
+    if request.method == "HEAD" and path == "/no-head.png":
+        return httpx.Response(405)
+    if request.method == "HEAD" and path == "/no-head.gif":
+        return httpx.Response(501)
+    content_types = {
+        "/a.jpg": "image/jpeg",
+        "/b.svg": "image/svg+xml",
+        "/page.jpg": "text/html",
+        "/no-head.png": "image/png",
+        "/no-head.gif": "image/gif",
+    }
+    return httpx.Response(
+        200, headers={"content-type": content_types[path]}, content=b"x" * 512
+    )
+
+
+class ScraperTests(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dl_path = Path(temp_dir.name)
+
+        client = partial(httpx.AsyncClient, transport=httpx.MockTransport(fake_site))
+        for patcher in [
+            mock.patch("imghunt.scraper.TEMP_DL_PATH", self.temp_dl_path),
+            mock.patch("imghunt.scraper.httpx.AsyncClient", client),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_rejects_invalid_query(self):
+        self.assertEqual(scraper("not a url"), ["Invalid URL. Try again!"])
+
+    def test_writes_images_into_zip(self):
+        result = scraper("https://site.test")
+
+        self.assertEqual(result["num_raw_links"], 7)
+        self.assertEqual(result["num_dl_images"], 4)
+        self.assertEqual(result["source_directory"], str(self.temp_dl_path))
+        with ZipFile(f"{result['destination_directory']}.zip") as zip_file:
+            entries = {
+                info.filename: info.compress_type for info in zip_file.infolist()
+            }
+        self.assertEqual(
+            entries,
+            {
+                "IMG_1.jpg": ZIP_STORED,
+                "IMG_2.svg": ZIP_DEFLATED,
+                "IMG_4.png": ZIP_STORED,
+                "IMG_5.gif": ZIP_STORED,
+            },
+        )
+
+    def test_keeps_links_refusing_head_requests(self):
+        result = scraper("https://site.test")
+        with ZipFile(f"{result['destination_directory']}.zip") as zip_file:
+            self.assertIn("IMG_4.png", zip_file.namelist())
+            self.assertIn("IMG_5.gif", zip_file.namelist())
+
+    def test_reports_dead_links_and_non_images(self):
+        result = scraper("https://site.test")
+
+        self.assertEqual(result["num_errors"], 3)
+        errors = {link: message for message, link in result["error_links"]}
+        self.assertEqual(errors["https://cdn.test/dead.png"], "First Pass - Dead Link")
+        self.assertEqual(
+            errors["https://cdn.test:abc/bad-port.jpg"], "First Pass - Dead Link"
+        )
+        self.assertEqual(
+            errors["https://cdn.test/page.jpg"], "Response is not an image"
+        )
+
+
+class FolderCleanupTests(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = Path(temp_dir.name)
+
+    def make(self, name, is_dir=False, age=60):
+        path = self.path / name
+        if is_dir:
+            path.mkdir()
+        else:
+            path.write_bytes(b"")
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_removes_old_archives_and_folders(self):
+        old_zip = self.make("IMGHUNT_old.zip")
+        old_dir = self.make("IMGHUNT_old", is_dir=True)
+        ds_store = self.make(".DS_Store")
+
+        remove_downloads(str(self.path), cutoff=time.time())
+
+        self.assertFalse(old_zip.exists())
+        self.assertFalse(old_dir.exists())
+        self.assertTrue(ds_store.exists())
+
+    def test_keeps_entries_newer_than_cutoff(self):
+        cutoff = time.time()
+        new_zip = self.make("IMGHUNT_new.zip", age=-60)
+
+        remove_downloads(str(self.path), cutoff=cutoff)
+
+        self.assertTrue(new_zip.exists())
+
+    def test_logs_background_failures(self):
+        future = Future()
+        future.set_exception(FileNotFoundError("temp_dl"))
+        with self.assertLogs("imghunt.views", "ERROR") as logs:
+            log_cleanup_error(future)
+        self.assertIn("Download cleanup failed", logs.output[0])
+
+
+class DownloadZipTests(SimpleTestCase):
+    def test_streams_archive_as_attachment(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            destination_dir = os.path.join(temp_dir, "IMGHUNT_test")
+            Path(f"{destination_dir}.zip").write_bytes(b"zip-bytes")
+            request = RequestFactory().get("/download")
+            request.session = {
+                "destination_directory": destination_dir,
+                "filename": "IMGHUNT_test",
+            }
+
+            response = download_zip(request)
+
+            self.assertIsInstance(response, FileResponse)
+            self.assertEqual(response["Content-Type"], "application/zip")
+            self.assertEqual(
+                response["Content-Disposition"],
+                'attachment; filename="IMGHUNT_test.zip"',
+            )
+            self.assertEqual(b"".join(response.streaming_content), b"zip-bytes")
+            response.close()
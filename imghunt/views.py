@@ -1,24 +1,50 @@
+import logging
 import os
 import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from django.contrib import messages
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import FileResponse, HttpResponseRedirect
 from django.shortcuts import redirect, render
 from django.urls import reverse
 
 from .scraper import scraper
 
+CLEANUP_POOL = ThreadPoolExecutor(max_workers=2)
+logger = logging.getLogger(__name__)
+
 
 def folder_cleanup(file_path: str) -> None:
-    files = os.listdir(file_path)
-    for filename in files:
-        fp = os.path.join(file_path, filename)
-        if filename.endswith(".DS_Store"):
-            pass
-        elif filename.endswith(".zip"):
-            os.remove(fp)
-        else:
-            shutil.rmtree(fp)
+    """Deletes previous downloads in the background so the page isn't held up."""
+    future = CLEANUP_POOL.submit(remove_downloads, file_path, time.time())
+    future.add_done_callback(log_cleanup_error)
+
+
+# ! Inside 'folder_cleanup'
+def log_cleanup_error(future: Future) -> None:
+    if (error := future.exception()) is not None:
+        logger.error("Download cleanup failed", exc_info=error)
+
+
+# ! Inside 'folder_cleanup'
+def remove_downloads(file_path: str, cutoff: float) -> None:
+    with os.scandir(file_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".DS_Store"):
+                continue
+            try:
+                # Leave anything written after the cleanup was requested.
+                # Unlike is_dir(), this is a stat syscall per entry on Linux.
+                if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                    continue
+                if entry.name.endswith(".zip"):
+                    os.remove(entry.path)
+                elif entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+            except FileNotFoundError:
+                # Already removed by another request's cleanup
+                pass
 
 
 # VIEWS
@@ -71,6 +97,9 @@ def success(request):
 def download_zip(request):
     fp = request.session.get("destination_directory")
     filename = request.session.get("filename")
-    response = HttpResponse(open(f"{fp}.zip", "rb"), content_type="application/zip")
-    response['Content-Disposition'] = f"attachment; filename={filename}.zip"
-    return response
+    return FileResponse(
+        open(f"{fp}.zip", "rb"),
+        as_attachment=True,
+        filename=f"{filename}.zip",
+        content_type="application/zip",
+    )